@@ -2,21 +2,21 @@ import pandas as pd
 import os
 from datetime import datetime
 
-def add_event_times(
-    video_events_path,
-    occurrences_path,
-    output_path=None
-):
+EVENT_TIME_COLUMNS = ['eventTime', 'endTime']
+
+
+def add_event_time_columns(df, get_occurrence):
     """
-    Update video_events.csv with eventTime and endTime from occurrence files.
+    Update a video_events DataFrame with eventTime and endTime from occurrence data.
 
     Args:
-        video_events_path: Path to video_events.csv
-        occurrences_path: Path to occurrences directory
-        output_path: Path to write updated CSV (if None, overwrites input)
+        df: video_events DataFrame (modified in place)
+        get_occurrence: Callable (date_part, video_id) -> occurrence DataFrame, or None if missing
     """
-    # Read video_events.csv
-    df = pd.read_csv(video_events_path)
+    # Times are written as strings (a blank column is read as float64)
+    for col in EVENT_TIME_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(object)
 
     # Parse the eventID to extract video_id
     for idx, row in df.iterrows():
@@ -37,17 +37,12 @@ def add_event_times(
         else:
             date_part = date_session
 
-        # Construct the occurrence filename
-        occurrence_file = f"{date_part}-{video_id}.csv"
-        occurrence_path = os.path.join(occurrences_path, occurrence_file)
-
-        if not os.path.exists(occurrence_path):
-            print(f"⚠ {video_id}: No occurrence file found")
-            continue
-
         try:
-            # Read the occurrence file
-            occ_df = pd.read_csv(occurrence_path)
+            occ_df = get_occurrence(date_part, video_id)
+
+            if occ_df is None:
+                print(f"⚠ {video_id}: No occurrence file found")
+                continue
 
             if 'date_time' not in occ_df.columns or occ_df.empty:
                 print(f"⚠ {video_id}: No date_time data")
@@ -80,6 +75,34 @@ def add_event_times(
         except Exception as e:
             print(f"✗ {video_id}: Error - {str(e)}")
 
+    return df
+
+
+def add_event_times(
+    video_events_path,
+    occurrences_path,
+    output_path=None
+):
+    """
+    Update video_events.csv with eventTime and endTime from occurrence files.
+
+    Args:
+        video_events_path: Path to video_events.csv
+        occurrences_path: Path to occurrences directory
+        output_path: Path to write updated CSV (if None, overwrites input)
+    """
+    # Read video_events.csv
+    df = pd.read_csv(video_events_path)
+
+    def read_occurrence(date_part, video_id):
+        # Construct the occurrence filename
+        occurrence_path = os.path.join(occurrences_path, f"{date_part}-{video_id}.csv")
+        if not os.path.exists(occurrence_path):
+            return None
+        return pd.read_csv(occurrence_path)
+
+    add_event_time_columns(df, read_occurrence)
+
     # Write the updated CSV
     if output_path is None:
         output_path = video_events_path
@@ -3,6 +3,59 @@ import numpy as np
 import os
 import json
 
+VIDEO_GPS_COLUMNS = ['decimalLatitude', 'decimalLongitude',
+                     'minimumElevationInMeters', 'maximumElevationInMeters',
+                     'footprintWKT']
+
+SESSION_GPS_COLUMNS = ['launchLatitude', 'launchLongitude',
+                       'decimalLatitude', 'decimalLongitude',
+                       'minimumElevationInMeters', 'maximumElevationInMeters',
+                       'footprintWKT']
+
+
+def extract_gps_stats(occ_df):
+    """
+    Extract GPS statistics from an occurrence DataFrame.
+
+    Returns:
+        dict with keys: launch_lat, launch_lon, min_lat, max_lat, min_lon, max_lon, min_alt, max_alt
+    """
+    if occ_df.empty:
+        return None
+
+    # Get GPS columns (coerce, since in-memory SRT values are strings)
+    lat_col = pd.to_numeric(occ_df['latitude'], errors='coerce').dropna()
+    lon_col = pd.to_numeric(occ_df['longitude'], errors='coerce').dropna()
+    alt_col = pd.to_numeric(occ_df['altitude'], errors='coerce').dropna()
+
+    if lat_col.empty or lon_col.empty:
+        return None
+
+    # Launch point is the first GPS coordinate
+    launch_lat = float(lat_col.iloc[0])
+    launch_lon = float(lon_col.iloc[0])
+
+    # Calculate min/max
+    stats = {
+        'launch_lat': launch_lat,
+        'launch_lon': launch_lon,
+        'min_lat': float(lat_col.min()),
+        'max_lat': float(lat_col.max()),
+        'min_lon': float(lon_col.min()),
+        'max_lon': float(lon_col.max()),
+    }
+
+    # Add altitude if available
+    if not alt_col.empty:
+        stats['min_alt'] = float(alt_col.min())
+        stats['max_alt'] = float(alt_col.max())
+    else:
+        stats['min_alt'] = None
+        stats['max_alt'] = None
+
+    return stats
+
+
 def extract_gps_from_occurrence(occurrence_path):
     """
     Extract GPS statistics from an occurrence file.
@@ -13,50 +66,36 @@ def extract_gps_from_occurrence(occurrence_path):
     try:
         # Read occurrence file with low_memory=False to avoid dtype warnings
         occ_df = pd.read_csv(occurrence_path, low_memory=False)
+        return extract_gps_stats(occ_df)
 
-        if occ_df.empty:
-            return None
+    except Exception as e:
+        print(f"Error processing {occurrence_path}: {str(e)}")
+        return None
 
-        # Get GPS columns
-        lat_col = occ_df['latitude'].dropna()
-        lon_col = occ_df['longitude'].dropna()
-        alt_col = occ_df['altitude'].dropna()
 
-        if lat_col.empty or lon_col.empty:
-            return None
+def find_occurrence_file(occurrences_path, date_part, video_id):
+    """
+    Find the occurrence file for a video, or None if it does not exist.
+    """
+    # Try with underscore first (for flight_1, flight_2 format)
+    occurrence_path = os.path.join(occurrences_path, f"{date_part}_{video_id}.csv")
 
-        # Launch point is the first GPS coordinate
-        launch_lat = float(lat_col.iloc[0])
-        launch_lon = float(lon_col.iloc[0])
-
-        # Calculate min/max
-        stats = {
-            'launch_lat': launch_lat,
-            'launch_lon': launch_lon,
-            'min_lat': float(lat_col.min()),
-            'max_lat': float(lat_col.max()),
-            'min_lon': float(lon_col.min()),
-            'max_lon': float(lon_col.max()),
-        }
-
-        # Add altitude if available
-        if not alt_col.empty:
-            stats['min_alt'] = float(alt_col.min())
-            stats['max_alt'] = float(alt_col.max())
-        else:
-            stats['min_alt'] = None
-            stats['max_alt'] = None
-
-        return stats
+    # If that doesn't exist, try with dash (for older format)
+    if not os.path.exists(occurrence_path):
+        occurrence_path = os.path.join(occurrences_path, f"{date_part}-{video_id}.csv")
 
-    except Exception as e:
-        print(f"Error processing {occurrence_path}: {str(e)}")
+    if not os.path.exists(occurrence_path):
         return None
+    return occurrence_path
 
 
-def add_gps_to_video_events(video_events_path, occurrences_path, output_path=None):
+def add_gps_columns(df, get_occurrence):
     """
-    Add GPS columns to video_events.csv from occurrence files.
+    Add GPS columns to a video_events DataFrame.
+
+    Args:
+        df: video_events DataFrame (modified in place)
+        get_occurrence: Callable (date_part, video_id) -> occurrence DataFrame, or None if missing
 
     Adds columns:
     - decimalLatitude (launch point)
@@ -65,17 +104,12 @@ def add_gps_to_video_events(video_events_path, occurrences_path, output_path=Non
     - maximumElevationInMeters
     - footprintWKT (bounding box in WKT format)
     """
-    # Read video_events.csv
-    df = pd.read_csv(video_events_path)
-
     # Add new columns if they don't exist
-    new_columns = ['decimalLatitude', 'decimalLongitude',
-                   'minimumElevationInMeters', 'maximumElevationInMeters',
-                   'footprintWKT']
-
-    for col in new_columns:
+    for col in VIDEO_GPS_COLUMNS:
         if col not in df.columns:
             df[col] = np.nan
+    # WKT strings need an object column (an all-NaN column is float64)
+    df['footprintWKT'] = df['footprintWKT'].astype(object)
 
     # Process each video
     for idx, row in df.iterrows():
@@ -92,22 +126,18 @@ def add_gps_to_video_events(video_events_path, occurrences_path, output_path=Non
         date_parts = date_session.split('_session_')
         date_part = date_parts[0] if len(date_parts) > 1 else date_session
 
-        # Construct occurrence filename
-        # Try with underscore first (for flight_1, flight_2 format)
-        occurrence_file = f"{date_part}_{video_id}.csv"
-        occurrence_path = os.path.join(occurrences_path, occurrence_file)
+        occ_df = get_occurrence(date_part, video_id)
 
-        # If that doesn't exist, try with dash (for older format)
-        if not os.path.exists(occurrence_path):
-            occurrence_file = f"{date_part}-{video_id}.csv"
-            occurrence_path = os.path.join(occurrences_path, occurrence_file)
-
-        if not os.path.exists(occurrence_path):
+        if occ_df is None:
             print(f"⚠ {video_id}: No occurrence file")
             continue
 
-        # Extract GPS data
-        gps_stats = extract_gps_from_occurrence(occurrence_path)
+        # Extract GPS data; a malformed occurrence skips this video only
+        try:
+            gps_stats = extract_gps_stats(occ_df)
+        except Exception as e:
+            print(f"Error processing {video_id}: {str(e)}")
+            continue
 
         if gps_stats is None:
             print(f"⚠ {video_id}: No GPS data")
@@ -133,6 +163,31 @@ def add_gps_to_video_events(video_events_path, occurrences_path, output_path=Non
               f"Bounds: lat[{gps_stats['min_lat']:.6f}, {gps_stats['max_lat']:.6f}], "
               f"lon[{gps_stats['min_lon']:.6f}, {gps_stats['max_lon']:.6f}]")
 
+    return df
+
+
+def add_gps_to_video_events(video_events_path, occurrences_path, output_path=None):
+    """
+    Add GPS columns to video_events.csv from occurrence files.
+
+    See add_gps_columns() for the columns added.
+    """
+    # Read video_events.csv
+    df = pd.read_csv(video_events_path)
+
+    def read_occurrence(date_part, video_id):
+        occurrence_path = find_occurrence_file(occurrences_path, date_part, video_id)
+        if occurrence_path is None:
+            return None
+        try:
+            # Read occurrence file with low_memory=False to avoid dtype warnings
+            return pd.read_csv(occurrence_path, low_memory=False)
+        except Exception as e:
+            print(f"Error processing {occurrence_path}: {str(e)}")
+            return pd.DataFrame()
+
+    add_gps_columns(df, read_occurrence)
+
     # Write updated CSV
     if output_path is None:
         output_path = video_events_path
@@ -142,9 +197,9 @@ def add_gps_to_video_events(video_events_path, occurrences_path, output_path=Non
     return df
 
 
-def add_gps_to_session_events(session_events_path, video_events_df, output_path=None):
+def add_gps_to_sessions(session_df, video_events_df):
     """
-    Add GPS columns to session_events.csv by aggregating from video_events.
+    Add GPS columns to a session_events DataFrame by aggregating from video_events.
 
     For each session:
     - launchLatitude/launchLongitude: Launch point of first video in session
@@ -153,17 +208,13 @@ def add_gps_to_session_events(session_events_path, video_events_df, output_path=
     - footprintWKT: Bounding box encompassing all videos in session
     - minimumElevationInMeters/maximumElevationInMeters: Min/max across all videos
     """
-    # Read session_events.csv
-    session_df = pd.read_csv(session_events_path)
-
     # Add new columns if they don't exist
-    new_columns = ['launchLatitude', 'launchLongitude',
-                   'minimumElevationInMeters', 'maximumElevationInMeters',
-                   'footprintWKT']
-
-    for col in new_columns:
+    for col in SESSION_GPS_COLUMNS:
         if col not in session_df.columns:
             session_df[col] = np.nan
+    # Ranges and WKT are written as strings
+    for col in ['decimalLatitude', 'decimalLongitude', 'footprintWKT']:
+        session_df[col] = session_df[col].astype(object)
 
     # Process each session
     for idx, row in session_df.iterrows():
@@ -213,6 +264,20 @@ def add_gps_to_session_events(session_events_path, video_events_df, output_path=
         print(f"✓ {session_id.split(':')[1]}: Launch ({first_video['decimalLatitude']:.6f}, {first_video['decimalLongitude']:.6f}), "
               f"Session bounds: lat[{min_lat:.6f}, {max_lat:.6f}], lon[{min_lon:.6f}, {max_lon:.6f}]")
 
+    return session_df
+
+
+def add_gps_to_session_events(session_events_path, video_events_df, output_path=None):
+    """
+    Add GPS columns to session_events.csv by aggregating from video_events.
+
+    See add_gps_to_sessions() for the columns added.
+    """
+    # Read session_events.csv
+    session_df = pd.read_csv(session_events_path)
+
+    add_gps_to_sessions(session_df, video_events_df)
+
     # Write updated CSV
     if output_path is None:
         output_path = session_events_path
@@ -0,0 +1,119 @@
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from merge_behavior_telemetry import (
+    pandify_srt_data,
+    merge_flight_log_data,
+    interpolate_flight_log_data,
+    FLIGHT_LOG_OFFSET,
+)
+
+" Compares merge_asof (nearest) and interpolated flight log alignment for speed and memory "
+
+
+def synthetic_inputs(minutes, fps=30, log_hz=10, tracks_per_frame=5, n_numeric=40, seed=0):
+    """
+    Build a merged_df and a flight log CSV resembling a DJI video and its Airdata log.
+
+    Returns:
+        (merged_df, flight_log_path) - the caller should delete flight_log_path
+    """
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2023-01-11 16:04:03.114286")
+
+    n_frames = int(minutes * 60 * fps)
+    frame_times = start + pd.to_timedelta(np.arange(n_frames) / fps, unit="s")
+    date_time = (frame_times.strftime("%Y-%m-%d %H:%M:%S") + ","
+                 + (frame_times.microsecond // 1000).astype(str) + ","
+                 + (frame_times.microsecond % 1000).astype(str))
+    frames = pd.DataFrame({"frame": np.arange(n_frames), "date_time": date_time})
+    merged_df = frames.loc[frames.index.repeat(tracks_per_frame)].reset_index(drop=True)
+    merged_df["id"] = np.tile(np.arange(tracks_per_frame), n_frames).astype(str)
+    merged_df["latitude"] = "0.123456"
+
+    # Log starts a few seconds before the video and ends after it
+    n_log = int((minutes * 60 + 20) * log_hz)
+    elapsed_ms = np.arange(n_log) * (1000 // log_hz)
+    log_times = start - pd.Timedelta("10s") + pd.to_timedelta(elapsed_ms, unit="ms") - FLIGHT_LOG_OFFSET
+    flight_df = pd.DataFrame({
+        "time(millisecond)": elapsed_ms,
+        "datetime(utc)": log_times.floor("s").strftime("%Y-%m-%d %H:%M:%S"),
+        "latitude": rng.normal(0.1, 0.001, n_log),
+        "flycState": rng.choice(["P-GPS", "Hover"], n_log),
+        "message": "",
+    })
+    for i in range(n_numeric):
+        flight_df[f"value_{i}"] = np.cumsum(rng.normal(size=n_log))
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    flight_df.to_csv(path, index=False)
+    return merged_df, path
+
+
+def measure(func, merged_df, flight_log_path, repeats):
+    """
+    Best wall time and peak traced memory of func(merged_df.copy(), flight_log_path).
+
+    Memory is traced in a separate run, since tracemalloc slows down Python code.
+    """
+    times = []
+    for _ in range(repeats):
+        df = merged_df.copy()
+        t0 = time.perf_counter()
+        result = func(df, flight_log_path)
+        times.append(time.perf_counter() - t0)
+
+    df = merged_df.copy()
+    tracemalloc.start()
+    func(df, flight_log_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark flight log alignment modes")
+    parser.add_argument("--srt", type=str, default=None, help="SRT file to benchmark on (default: synthetic data)")
+    parser.add_argument("--flight_log", type=str, default=None, help="Flight log CSV matching --srt")
+    parser.add_argument("--minutes", type=float, default=10, help="Length of the synthetic video")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per mode (best time is reported)")
+    args = parser.parse_args()
+
+    cleanup = None
+    if args.srt and args.flight_log:
+        merged_df = pandify_srt_data(args.srt)
+        flight_log_path = args.flight_log
+    else:
+        merged_df, flight_log_path = synthetic_inputs(args.minutes)
+        cleanup = flight_log_path
+
+    try:
+        print(f"Rows: {len(merged_df)}")
+        results = {}
+        for name, func in (("nearest", merge_flight_log_data), ("interpolate", interpolate_flight_log_data)):
+            seconds, peak, result = measure(func, merged_df, flight_log_path, args.repeats)
+            results[name] = result
+            print(f"{name:>12}: {seconds:8.3f} s, peak memory {peak / 1024 ** 2:8.1f} MB")
+
+        # Interpolated values should stay close to the nearest-sample values
+        nearest = results["nearest"].sort_values("date_time", kind="stable").reset_index(drop=True)
+        interpolated = results["interpolate"].sort_values("date_time", kind="stable").reset_index(drop=True)
+        shared = [c for c in nearest.columns
+                  if c in interpolated.columns and c not in merged_df.columns
+                  and pd.api.types.is_numeric_dtype(interpolated[c])]
+        coverage = {name: float(df[shared].notna().all(axis=1).mean()) if shared else None
+                    for name, df in (("nearest", nearest), ("interpolate", interpolated))}
+        print(f"Frames with flight log values: {coverage}")
+    finally:
+        if cleanup:
+            os.remove(cleanup)
+
+
+if __name__ == "__main__":
+    main()
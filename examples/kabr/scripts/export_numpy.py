@@ -0,0 +1,190 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from glob import glob
+from tqdm import tqdm
+
+" Fixed-dtype .npy export of occurrence data for memory-mapped random access "
+
+# One record per (frame, track); frames without an annotated track have track == -1
+RECORD_DTYPE = np.dtype([
+    ('frame', '<i4'),
+    ('track', '<i4'),
+    ('xtl', '<f4'),
+    ('ytl', '<f4'),
+    ('xbr', '<f4'),
+    ('ybr', '<f4'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('altitude', '<f4'),
+    ('iso', '<f4'),
+    ('fnum', '<f4'),
+    ('ev', '<f4'),
+    ('ct', '<f4'),
+    ('focal_len', '<f4'),
+    ('dzoom_ratio', '<f4'),
+    ('behaviour', '<i2'),
+    ('label', '<i2'),
+])
+
+# One record per track: data[start:stop] holds its rows sorted by frame
+INDEX_DTYPE = np.dtype([
+    ('track', '<i4'),
+    ('start', '<i8'),
+    ('stop', '<i8'),
+    ('first_frame', '<i4'),
+    ('last_frame', '<i4'),
+])
+
+CATEGORICAL_FIELDS = ['behaviour', 'label']
+
+
+def encode_categorical(values, vocabulary):
+    """
+    Encode string values as int codes, appending unseen values to vocabulary.
+
+    Missing values are encoded as -1.
+    """
+    codes = {value: i for i, value in enumerate(vocabulary)}
+    present = values.dropna().astype(str)
+    for value in present.unique():
+        if value not in codes:
+            codes[value] = len(vocabulary)
+            vocabulary.append(value)
+    return values.astype(object).map(lambda v: codes[str(v)] if pd.notna(v) else -1).to_numpy()
+
+
+def occurrence_to_records(occ_df, vocabularies):
+    """
+    Convert an occurrence DataFrame to a RECORD_DTYPE array sorted by (track, frame),
+    with one record per (frame, track).
+    """
+    n = len(occ_df)
+    records = np.empty(n, dtype=RECORD_DTYPE)
+
+    records['frame'] = pd.to_numeric(occ_df['frame'], errors='coerce').fillna(-1).to_numpy()
+    if 'id' in occ_df.columns:
+        records['track'] = pd.to_numeric(occ_df['id'], errors='coerce').fillna(-1).to_numpy()
+    else:
+        records['track'] = -1
+
+    for name in RECORD_DTYPE.names:
+        if name in ('frame', 'track') or name in CATEGORICAL_FIELDS:
+            continue
+        if name in occ_df.columns:
+            records[name] = pd.to_numeric(occ_df[name], errors='coerce').to_numpy()
+        else:
+            records[name] = np.nan
+
+    for name in CATEGORICAL_FIELDS:
+        if name in occ_df.columns:
+            records[name] = encode_categorical(occ_df[name], vocabularies.setdefault(name, []))
+        else:
+            records[name] = -1
+
+    records = records[np.lexsort((records['frame'], records['track']))]
+    # The mini-scene merge repeats (frame, id) rows where tracks overlap; keep the first
+    first = np.r_[True, (records['track'][1:] != records['track'][:-1])
+                  | (records['frame'][1:] != records['frame'][:-1])]
+    return records[first]
+
+
+def build_track_index(records):
+    """
+    Build the per-track offset index for records sorted by (track, frame).
+    """
+    tracks = records['track']
+    starts = np.flatnonzero(np.r_[True, tracks[1:] != tracks[:-1]]) if len(tracks) else np.array([], dtype=np.int64)
+    stops = np.r_[starts[1:], len(tracks)]
+
+    index = np.empty(len(starts), dtype=INDEX_DTYPE)
+    index['track'] = tracks[starts]
+    index['start'] = starts
+    index['stop'] = stops
+    index['first_frame'] = records['frame'][starts]
+    index['last_frame'] = records['frame'][stops - 1]
+    return index
+
+
+def export_video(occ_df, out_dir, vocabularies):
+    """
+    Write one video's occurrence data as data.npy (records) and index.npy (track offsets).
+
+    Args:
+        occ_df: Occurrence DataFrame, e.g. from merge_behavior_telemetry.process_video()
+        out_dir: Directory for this video's arrays
+        vocabularies: dict of categorical field -> list of values, shared across videos
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    records = occurrence_to_records(occ_df, vocabularies)
+    np.save(os.path.join(out_dir, "data.npy"), records)
+    np.save(os.path.join(out_dir, "index.npy"), build_track_index(records))
+
+
+def load_vocabularies(out_root):
+    """
+    Load the code tables of a previous export so new videos reuse the same codes.
+    """
+    path = os.path.join(out_root, "vocabularies.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_vocabularies(out_root, vocabularies):
+    """
+    Write the categorical code tables shared by all exported videos.
+    """
+    os.makedirs(out_root, exist_ok=True)
+    with open(os.path.join(out_root, "vocabularies.json"), "w") as f:
+        json.dump({name: vocabularies.get(name, []) for name in CATEGORICAL_FIELDS}, f, indent=2)
+
+
+def open_video(video_dir):
+    """
+    Memory-map an exported video.
+
+    Returns:
+        (data, index) read-only memmaps with RECORD_DTYPE and INDEX_DTYPE
+    """
+    data = np.load(os.path.join(video_dir, "data.npy"), mmap_mode="r")
+    index = np.load(os.path.join(video_dir, "index.npy"), mmap_mode="r")
+    return data, index
+
+
+def track_window(data, index, track, start_frame=None, end_frame=None):
+    """
+    Return the records of one track between start_frame and end_frame (inclusive).
+
+    The result is a view into the memmap; no data is copied until it is read.
+    track=-1 returns the frames without an annotated track; their boxes and
+    telemetry are NaN, since occurrence files only carry telemetry on annotated rows.
+    """
+    pos = np.searchsorted(index['track'], track)
+    if pos == len(index) or index['track'][pos] != track:
+        return data[0:0]
+    rows = data[index['start'][pos]:index['stop'][pos]]
+    lo = 0 if start_frame is None else np.searchsorted(rows['frame'], start_frame, side='left')
+    hi = len(rows) if end_frame is None else np.searchsorted(rows['frame'], end_frame, side='right')
+    return rows[lo:hi]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export occurrence files to memory-mappable .npy arrays")
+    parser.add_argument("--occurrences", type=str, required=True, help="Path to occurrences directory")
+    parser.add_argument("--output", type=str, required=True, help="Directory to write one sub-directory per video")
+    args = parser.parse_args()
+
+    vocabularies = load_vocabularies(args.output)
+    for path in tqdm(sorted(glob(os.path.join(args.occurrences, "*.csv")))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        export_video(pd.read_csv(path, low_memory=False), os.path.join(args.output, name), vocabularies)
+    write_vocabularies(args.output, vocabularies)
+    print(f"Exported arrays written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
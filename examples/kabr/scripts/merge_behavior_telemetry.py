@@ -3,6 +3,7 @@ import os
 import json
 import pysrt
 import argparse
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from glob import glob
@@ -11,6 +12,21 @@ import xml.etree.ElementTree as ET
 
 " Based on script authored by Otto Brookes for KABR-2023 project "
 
+DEFAULT_SESSION_DATA_PATH = "/fs/ess/PAS2136/Kenya-2023/Zebras/session_data"
+DEFAULT_FLIGHT_LOGS_PATH = "/fs/ess/PAS2136/Kenya-2023/Zebras/Flight_Logs/decrypted_flight_logs"
+
+# Flight log datetimes are 3 hours behind actual time
+FLIGHT_LOG_OFFSET = pd.Timedelta(hours=3)
+FLIGHT_LOG_TOLERANCE = pd.Timedelta('2s')
+
+# Number-coded flight log columns that must not be blended between samples
+# (flags such as isVideo, state codes such as flycStateRaw, satellite counts)
+FLIGHT_LOG_CODED_COLUMNS = re.compile(r"^is[A-Z]|Raw$|gpsNum|satellites|(?i:state|mode)")
+# Integer columns with at most this many distinct values are treated as codes too
+FLIGHT_LOG_MAX_CODES = 16
+# Compass headings in degrees, interpolated across the 359 -> 0 wrap
+FLIGHT_LOG_HEADING_COLUMNS = re.compile(r"(?i)heading")
+
 
 def pandify_xml_tracks(path2tracks):
     elems = []
@@ -61,6 +77,20 @@ def pandify_srt_data(path2srt):
     return srt_df
 
 
+def parse_srt_datetimes(date_times):
+    """
+    Parse SRT timestamps ("2023-01-11 16:04:03,114,286") into datetime64 values.
+
+    Unparseable values become NaT. Values always have nanosecond resolution.
+    """
+    parts = date_times.astype("string").str.extract(r"^(\S+ \S+),(\d+),(\d+)$")
+    return (
+        pd.to_datetime(parts[0], format="%Y-%m-%d %H:%M:%S", errors="coerce")
+        + pd.to_timedelta(pd.to_numeric(parts[1], errors="coerce"), unit="ms")
+        + pd.to_timedelta(pd.to_numeric(parts[2], errors="coerce"), unit="us")
+    ).astype("datetime64[ns]")
+
+
 def get_per_frame_annotations(path2xml):
     et = ET.parse(path2xml)
     root = et.getroot()
@@ -152,7 +182,7 @@ def find_flight_log(flight_logs_path, srt_df):
                 continue
 
             # Convert to datetime and add 3 hours (flight logs are 3 hours behind)
-            log_df['datetime_corrected'] = pd.to_datetime(log_df['datetime(utc)']) + pd.Timedelta(hours=3)
+            log_df['datetime_corrected'] = pd.to_datetime(log_df['datetime(utc)']) + FLIGHT_LOG_OFFSET
 
             # Check if SRT datetime falls within flight log timerange
             log_start = log_df['datetime_corrected'].min()
@@ -196,7 +226,7 @@ def merge_flight_log_data(merged_df, flight_log_path):
 
         # Flight log format: "2023-01-11 07:45:46"
         # IMPORTANT: Flight log datetimes are 3 hours behind actual time - add 3 hours
-        flight_df['datetime_merge'] = pd.to_datetime(flight_df['datetime(utc)']) + pd.Timedelta(hours=3)
+        flight_df['datetime_merge'] = pd.to_datetime(flight_df['datetime(utc)']) + FLIGHT_LOG_OFFSET
 
         # Merge on datetime
         merged_df['datetime_merge'] = pd.to_datetime(merged_df['datetime_merge'])
@@ -211,7 +241,7 @@ def merge_flight_log_data(merged_df, flight_log_path):
             flight_df,
             on='datetime_merge',
             direction='nearest',
-            tolerance=pd.Timedelta('2s'),  # Increased tolerance to 2 seconds
+            tolerance=FLIGHT_LOG_TOLERANCE,  # Increased tolerance to 2 seconds
             suffixes=('', '_flight')
         )
 
@@ -234,6 +264,287 @@ def merge_flight_log_data(merged_df, flight_log_path):
         return merged_df
 
 
+def flight_log_times(flight_df):
+    """
+    Sub-second timestamps (corrected to local time) for flight log rows.
+
+    datetime(utc) only has 1 s resolution. When the log also has the elapsed
+    time(millisecond) column, the start time is estimated as the midpoint of
+    the interval consistent with every row, and each row is placed at
+    start + elapsed time.
+    """
+    seconds = pd.to_datetime(flight_df['datetime(utc)']) + FLIGHT_LOG_OFFSET
+    if 'time(millisecond)' not in flight_df.columns:
+        return seconds
+    elapsed = pd.to_timedelta(pd.to_numeric(flight_df['time(millisecond)'], errors='coerce'), unit='ms')
+    start_candidates = seconds - elapsed
+    start = start_candidates.max() + (start_candidates.min() + pd.Timedelta('1s') - start_candidates.max()) / 2
+    if pd.isna(start) or start_candidates.max() - start_candidates.min() > pd.Timedelta('1s'):
+        # Inconsistent clock (e.g. pauses in recording): keep whole-second times
+        return seconds
+    return start + elapsed
+
+
+def is_coded_column(name, values):
+    """
+    Whether a numeric flight log column holds codes rather than a continuous quantity.
+
+    Matches FLIGHT_LOG_CODED_COLUMNS by name, or was read as an integer column
+    with at most FLIGHT_LOG_MAX_CODES distinct values.
+    """
+    if FLIGHT_LOG_CODED_COLUMNS.search(name):
+        return True
+    return pd.api.types.is_integer_dtype(values) and values.nunique() <= FLIGHT_LOG_MAX_CODES
+
+
+def interpolate_flight_log_data(merged_df, flight_log_path):
+    """
+    Attach flight log data by interpolating numeric columns onto the frame timestamps.
+
+    Continuous numeric flight log columns are converted to one float array and
+    linearly interpolated at every frame's full-precision SRT timestamp in a
+    single batched pass. Headings are interpolated on unwrapped degrees and
+    wrapped back into [0, 360). Text columns and number-coded columns (flags,
+    states, counts; see is_coded_column()) keep nearest matching. Frames further
+    than FLIGHT_LOG_TOLERANCE from the nearest log sample get NaN, as with
+    merge_flight_log_data().
+
+    Args:
+        merged_df: Main dataframe with date_time column
+        flight_log_path: Path to flight log CSV
+
+    Returns:
+        Dataframe with flight log columns added (row order unchanged)
+    """
+    if flight_log_path is None or not os.path.exists(flight_log_path):
+        return merged_df
+
+    try:
+        flight_df = pd.read_csv(flight_log_path, low_memory=False)
+        log_times = flight_log_times(flight_df)
+        valid = log_times.notna().to_numpy()
+        flight_df = flight_df[valid]
+        log_ns = log_times[valid].to_numpy().astype('datetime64[ns]').astype(np.int64)
+        order = np.argsort(log_ns, kind='stable')
+        log_ns = log_ns[order]
+        flight_df = flight_df.iloc[order].reset_index(drop=True)
+
+        # Several rows share a frame, so align each distinct timestamp once
+        codes, unique_times = pd.factorize(merged_df['date_time'])
+        parsed = parse_srt_datetimes(pd.Series(unique_times))
+        frame_ns = parsed.to_numpy().astype(np.int64)
+        has_time = parsed.notna().to_numpy()
+        # Rows without date_time point at an extra, never matched slot
+        codes = np.where(codes < 0, len(unique_times), codes)
+
+        # Keep the SRT versions of position columns (more accurate for video frames)
+        columns = [c for c in flight_df.columns
+                   if not (c in merged_df.columns and c in ('latitude', 'longitude', 'altitude'))]
+        numeric = {}
+        categorical = []
+        for col in columns:
+            values = pd.to_numeric(flight_df[col], errors='coerce')
+            if (values.notna().sum() == flight_df[col].notna().sum() and values.notna().any()
+                    and not is_coded_column(col, flight_df[col])):
+                numeric[col] = values.to_numpy(np.float64)
+            else:
+                categorical.append(col)
+        headings = [i for i, col in enumerate(numeric) if FLIGHT_LOG_HEADING_COLUMNS.search(col)]
+        for i in headings:
+            col = list(numeric)[i]
+            values = numeric[col].copy()
+            present = ~np.isnan(values)
+            values[present] = np.unwrap(values[present], period=360)
+            numeric[col] = values
+
+        # One searchsorted and one weighted sum for all numeric columns
+        right = np.clip(np.searchsorted(log_ns, frame_ns, side='left'), 1, len(log_ns) - 1)
+        left = right - 1
+        span = (log_ns[right] - log_ns[left]).astype(np.float64)
+        weight = np.clip(np.divide(frame_ns - log_ns[left], span, out=np.zeros_like(span), where=span > 0), 0, 1)
+        nearest = np.where(weight < 0.5, left, right)
+        distance = np.abs(frame_ns - log_ns[nearest])
+        matched = np.append(has_time & (distance <= FLIGHT_LOG_TOLERANCE.value), False)
+        nearest = np.append(nearest, 0)
+
+        names = {col: f'{col}_flight' if col in merged_df.columns else col for col in columns}
+        values = np.column_stack(list(numeric.values())) if numeric else np.empty((len(log_ns), 0))
+        interpolated = np.empty((len(matched), len(numeric)))
+        interpolated[:-1] = values[left]
+        interpolated[:-1] += weight[:, None] * (values[right] - values[left])
+        interpolated[:, headings] = np.mod(interpolated[:, headings], 360)
+        interpolated[~matched] = np.nan
+        # Expand to rows as one float block, avoiding a per-column copy
+        numeric_df = pd.DataFrame(interpolated[codes], columns=[names[c] for c in numeric],
+                                  index=merged_df.index, copy=False)
+
+        categorical_columns = {}
+        for col in categorical:
+            picked = flight_df[col].to_numpy(dtype=object)[nearest]
+            picked[~matched] = None
+            categorical_columns[names[col]] = picked[codes]
+        categorical_df = pd.DataFrame(categorical_columns, index=merged_df.index)
+
+        result_df = pd.concat([merged_df, numeric_df, categorical_df], axis=1)
+
+        print(f"  Interpolated flight log: {os.path.basename(flight_log_path)} "
+              f"({len(numeric)} numeric, {len(categorical)} nearest-matched columns)")
+        return result_df
+
+    except Exception as e:
+        print(f"  Warning: Could not interpolate flight log: {str(e)}")
+        return merged_df
+
+
+def process_video(d, path2data, session_data_root, flight_logs_path=None, flight_log_alignment="nearest",
+                  return_frames=False):
+    """
+    Merge SRT telemetry, detection tracks, flight log and behaviour annotations for one video.
+
+    Args:
+        d: Video directory name (format: DATE-FILENAME, e.g. '11_01_23-DJI_0488')
+        path2data: Path to the data directory containing video directories
+        session_data_root: Root path to session_data directory
+        flight_logs_path: Path to decrypted_flight_logs directory (None skips flight logs)
+        flight_log_alignment: "nearest" (merge_flight_log_data) or "interpolate" (interpolate_flight_log_data)
+        return_frames: Also return the per-frame telemetry and detection tracks
+
+    Returns:
+        Frame-level occurrence DataFrame sorted by frame. With return_frames, a tuple
+        (occurrence_df, telemetry_df, track_df) where telemetry_df has one row per SRT
+        frame with SRT and flight log columns, and track_df is pandify_xml_tracks() output.
+        Only annotated rows of the occurrence DataFrame carry telemetry.
+    """
+    # Parse directory name to get date and filename
+    # Format: DATE-FILENAME (e.g., '11_01_23-DJI_0488' or '17_01_2023_session_1-DJI_0005')
+    parts = d.split("-")
+    date_part = parts[0]
+    filename = parts[-1]
+
+    # Formulate paths
+    path2tracks = f"{path2data}/{d}/metadata/{filename}_tracks.xml"
+    path2annotations = f"{path2data}/{d}/actions/"
+
+    # Find SRT file recursively
+    path2srt = find_srt_file(session_data_root, date_part, filename)
+
+    if path2srt is None:
+        raise FileNotFoundError(f"Could not find SRT file for {date_part}-{filename}")
+
+    print(f"Processing {d}: Found SRT at {path2srt}")
+
+    # initialise dfs:
+    srt_df = pandify_srt_data(path2srt)
+    track_df = pandify_xml_tracks(path2tracks)
+    merged_df = srt_df.merge(track_df, on="frame", how="left")
+
+    # Add date and video_id columns to ALL rows
+    merged_df.insert(0, "date", date_part)
+    merged_df.insert(1, "video_id", filename)
+
+    # Move frame to position 2
+    frame_col = merged_df.pop("frame")
+    merged_df.insert(2, "frame", frame_col)
+
+    # Move id (mini-scene id) to position 3
+    if "id" in merged_df.columns:
+        id_col = merged_df.pop("id")
+        merged_df.insert(3, "id", id_col)
+
+    # Ensure date_time is preserved (move to position 4)
+    if "date_time" in merged_df.columns:
+        datetime_col = merged_df.pop("date_time")
+        merged_df.insert(4, "date_time", datetime_col)
+
+    # Find and merge flight log data if path provided
+    if flight_logs_path:
+        flight_log_path = find_flight_log(flight_logs_path, srt_df)
+        if flight_log_path and flight_log_alignment == "interpolate":
+            merged_df = interpolate_flight_log_data(merged_df, flight_log_path)
+        elif flight_log_path:
+            merged_df = merge_flight_log_data(merged_df, flight_log_path)
+
+    # Add per frame behaviours to existing df
+    mini_scene_df = add_per_frame_behaviours(merged_df, path2annotations)
+
+    # Merge with frame df to preserve all frames (including those without annotations)
+    frame_df = merged_df[['date', 'video_id', 'frame', 'date_time']]
+    mini_scene_df = frame_df.merge(
+        mini_scene_df, on="frame", how="left"
+    )
+
+    # Remove duplicate date/video_id columns if they exist
+    for col in ['date_x', 'date_y', 'video_id_x', 'video_id_y', 'date_time_x', 'date_time_y']:
+        if col in mini_scene_df.columns:
+            # Keep the non-null version
+            base_col = col.rsplit('_', 1)[0]
+            if f'{base_col}_x' in mini_scene_df.columns and f'{base_col}_y' in mini_scene_df.columns:
+                mini_scene_df[base_col] = mini_scene_df[f'{base_col}_x'].fillna(mini_scene_df[f'{base_col}_y'])
+                mini_scene_df = mini_scene_df.drop([f'{base_col}_x', f'{base_col}_y'], axis=1)
+
+    mini_scene_df = mini_scene_df.sort_values(by="frame")
+    if return_frames:
+        track_columns = [col for col in track_df.columns if col != "frame"]
+        telemetry_df = merged_df.drop(columns=track_columns, errors="ignore").drop_duplicates("frame")
+        return mini_scene_df, telemetry_df, track_df
+    return mini_scene_df
+
+
+def parse_shard(text):
+    """
+    Parse a shard spec "i/N" (0 <= i < N), e.g. "$SLURM_ARRAY_TASK_ID/16".
+    """
+    try:
+        index, count = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {text!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must satisfy 0 <= i < N, got {text!r}")
+    return index, count
+
+
+def srt_file_size(session_data_root, d):
+    """
+    Size in bytes of the SRT file for a video directory, or 0 if it cannot be found.
+    """
+    parts = d.split("-")
+    path2srt = find_srt_file(session_data_root, parts[0], parts[-1])
+    return os.path.getsize(path2srt) if path2srt else 0
+
+
+def assign_shards(data_dirs, sizes, num_shards):
+    """
+    Deterministically split data_dirs into num_shards balanced by size.
+
+    Largest videos are assigned first, each to the currently lightest shard
+    (ties broken by name and shard index), so every array task computes the
+    same assignment independently.
+
+    Returns:
+        List of num_shards lists of directory names
+    """
+    shards = [[] for _ in range(num_shards)]
+    loads = [0] * num_shards
+    for d in sorted(data_dirs, key=lambda x: (-sizes.get(x, 0), x)):
+        target = min(range(num_shards), key=lambda i: (loads[i], i))
+        shards[target].append(d)
+        loads[target] += sizes.get(d, 0)
+    return [sorted(shard) for shard in shards]
+
+
+def write_manifest(manifest_dir, manifest):
+    """
+    Write a shard results manifest atomically.
+    """
+    os.makedirs(manifest_dir, exist_ok=True)
+    name = f"shard_{manifest['shard']:04d}_of_{manifest['num_shards']:04d}.json"
+    path = os.path.join(manifest_dir, name)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    print(f"Manifest written to: {path}")
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -244,13 +555,13 @@ def main():
     parser.add_argument(
         "--session_data_path",
         type=str,
-        default="/fs/ess/PAS2136/Kenya-2023/Zebras/session_data",
+        default=DEFAULT_SESSION_DATA_PATH,
         help="Path to session_data directory containing SRT files",
     )
     parser.add_argument(
         "--flight_logs_path",
         type=str,
-        default="/fs/ess/PAS2136/Kenya-2023/Zebras/Flight_Logs/decrypted_flight_logs",
+        default=DEFAULT_FLIGHT_LOGS_PATH,
         help="Path to decrypted_flight_logs directory",
     )
     parser.add_argument(
@@ -258,96 +569,101 @@ def main():
         action="store_true",
         help="Skip merging with airdata/flight log files",
     )
+    parser.add_argument(
+        "--flight_log_alignment",
+        choices=["nearest", "interpolate"],
+        default="nearest",
+        help="How to attach flight log rows to frames: nearest sample within 2s, or interpolate numeric columns",
+    )
     parser.add_argument("--write", type=bool, default=True)
     parser.add_argument("--outpath", type=str, help="Path to write csvs to")
+    parser.add_argument(
+        "--export_npy",
+        type=str,
+        default=None,
+        help="Also write memory-mappable .npy arrays per video to this directory",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=None,
+        help="Only process shard i of N (format: i/N, 0-based), balanced by SRT file size",
+    )
+    parser.add_argument(
+        "--manifest_dir",
+        type=str,
+        default=None,
+        help="Directory to write a per-shard results manifest to (merge with reduce_shards.py)",
+    )
     args = parser.parse_args()
 
     path2data = args.data_path
     session_data_root = args.session_data_path
     flight_logs_path = args.flight_logs_path
-    data_dirs = [x for x in os.listdir(path2data) if not x.startswith(".")]
+    data_dirs = sorted(x for x in os.listdir(path2data) if not x.startswith("."))
     path2write = args.outpath
 
+    shard_index, num_shards = args.shard or (0, 1)
+    if num_shards > 1:
+        sizes = {d: srt_file_size(session_data_root, d) for d in data_dirs}
+        data_dirs = assign_shards(data_dirs, sizes, num_shards)[shard_index]
+        print(f"Shard {shard_index}/{num_shards}: {len(data_dirs)} videos, "
+              f"{sum(sizes[d] for d in data_dirs)} SRT bytes")
+
     good = 0
     fail = 0
     failed_files = []
+    errors = {}
+    outputs = {}
+    if args.export_npy:
+        from export_numpy import export_video, load_vocabularies, write_vocabularies
+    # Shards must not share a vocabulary file; reduce_shards.py builds the common one
+    if args.export_npy and num_shards == 1:
+        vocabularies = load_vocabularies(args.export_npy)
+    else:
+        vocabularies = {}
 
     for d in tqdm(data_dirs):
         try:
-            # Parse directory name to get date and filename
-            # Format: DATE-FILENAME (e.g., '11_01_23-DJI_0488' or '17_01_2023_session_1-DJI_0005')
-            parts = d.split("-")
-            date_part = parts[0]
-            filename = parts[-1]
-
-            # Formulate paths
-            path2tracks = f"{path2data}/{d}/metadata/{filename}_tracks.xml"
-            path2annotations = f"{path2data}/{d}/actions/"
-
-            # Find SRT file recursively
-            path2srt = find_srt_file(session_data_root, date_part, filename)
-
-            if path2srt is None:
-                raise FileNotFoundError(f"Could not find SRT file for {date_part}-{filename}")
-
-            print(f"Processing {d}: Found SRT at {path2srt}")
-
-            # initialise dfs:
-            srt_df = pandify_srt_data(path2srt)
-            track_df = pandify_xml_tracks(path2tracks)
-            merged_df = srt_df.merge(track_df, on="frame", how="left")
-
-            # Add date and video_id columns to ALL rows
-            merged_df.insert(0, "date", date_part)
-            merged_df.insert(1, "video_id", filename)
-
-            # Move frame to position 2
-            frame_col = merged_df.pop("frame")
-            merged_df.insert(2, "frame", frame_col)
-
-            # Move id (mini-scene id) to position 3
-            if "id" in merged_df.columns:
-                id_col = merged_df.pop("id")
-                merged_df.insert(3, "id", id_col)
-
-            # Ensure date_time is preserved (move to position 4)
-            if "date_time" in merged_df.columns:
-                datetime_col = merged_df.pop("date_time")
-                merged_df.insert(4, "date_time", datetime_col)
-
-            # Find and merge flight log data if path provided and not skipped
-            if flight_logs_path and not args.skip_airdata:
-                flight_log_path = find_flight_log(flight_logs_path, srt_df)
-                if flight_log_path:
-                    merged_df = merge_flight_log_data(merged_df, flight_log_path)
-
-            # Add per frame behaviours to existing df
-            mini_scene_df = add_per_frame_behaviours(merged_df, path2annotations)
-
-            # Merge with frame df to preserve all frames (including those without annotations)
-            frame_df = merged_df[['date', 'video_id', 'frame', 'date_time']]
-            mini_scene_df = frame_df.merge(
-                mini_scene_df, on="frame", how="left"
+            mini_scene_df = process_video(
+                d,
+                path2data,
+                session_data_root,
+                None if args.skip_airdata else flight_logs_path,
+                args.flight_log_alignment,
             )
 
-            # Remove duplicate date/video_id columns if they exist
-            for col in ['date_x', 'date_y', 'video_id_x', 'video_id_y', 'date_time_x', 'date_time_y']:
-                if col in mini_scene_df.columns:
-                    # Keep the non-null version
-                    base_col = col.rsplit('_', 1)[0]
-                    if f'{base_col}_x' in mini_scene_df.columns and f'{base_col}_y' in mini_scene_df.columns:
-                        mini_scene_df[base_col] = mini_scene_df[f'{base_col}_x'].fillna(mini_scene_df[f'{base_col}_y'])
-                        mini_scene_df = mini_scene_df.drop([f'{base_col}_x', f'{base_col}_y'], axis=1)
-
+            outputs[d] = {}
             if args.write:
-                mini_scene_df.sort_values(by="frame").to_csv(path2write+f"{d}.csv", index=False)
+                mini_scene_df.to_csv(path2write+f"{d}.csv", index=False)
+                outputs[d]["csv"] = path2write+f"{d}.csv"
+            if args.export_npy:
+                export_video(mini_scene_df, os.path.join(args.export_npy, d), vocabularies)
+                outputs[d]["npy"] = os.path.join(args.export_npy, d)
             good += 1
         except Exception as e:
             failed_files.append(d)
+            errors[d] = str(e)
             print(f"Failed on {d}: {str(e)}")
             fail += 1
+    if args.export_npy and num_shards == 1:
+        write_vocabularies(args.export_npy, vocabularies)
     print("Pass: ", good, "Fail: ", fail)
     print("Failed files:", failed_files)
 
+    if args.manifest_dir:
+        write_manifest(args.manifest_dir, {
+            "shard": shard_index,
+            "num_shards": num_shards,
+            "assigned": data_dirs,
+            "passed": good,
+            "failed": fail,
+            "failed_files": failed_files,
+            "errors": errors,
+            "outputs": outputs,
+            "export_npy": args.export_npy,
+            "npy_vocabularies": vocabularies if args.export_npy else None,
+        })
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,254 @@
+import os
+import json
+import argparse
+import threading
+import pandas as pd
+from glob import glob
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from merge_behavior_telemetry import parse_srt_datetimes
+
+" Cached query layer over occurrence files for interactive analysis "
+
+NUMERIC_COLUMNS = ['latitude', 'longitude', 'altitude', 'iso', 'fnum', 'ev', 'ct',
+                   'focal_len', 'dzoom_ratio', 'xtl', 'ytl', 'xbr', 'ybr']
+CATEGORY_COLUMNS = ['date', 'video_id', 'label', 'behaviour']
+
+
+def load_occurrence(path):
+    """
+    Read an occurrence CSV into compact, typed columns.
+
+    Adds a 'timestamp' column (datetime64) parsed from date_time.
+    """
+    df = pd.read_csv(path, low_memory=False)
+    df['frame'] = pd.to_numeric(df['frame'], errors='coerce').astype('Int32')
+    if 'id' in df.columns:
+        df['id'] = pd.to_numeric(df['id'], errors='coerce').astype('Int32')
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'date_time' in df.columns:
+        df['timestamp'] = parse_srt_datetimes(df['date_time'])
+    return df
+
+
+def time_window_mask(timestamps, start=None, end=None):
+    """
+    Boolean mask for timestamps within [start, end].
+
+    start/end may be full datetimes ("2023-01-11 16:04:03") or times of day ("16:04:03").
+    """
+    mask = pd.Series(True, index=timestamps.index)
+    for bound, keep in ((start, lambda a, b: a >= b), (end, lambda a, b: a <= b)):
+        if bound is None:
+            continue
+        if "-" in str(bound):
+            mask &= keep(timestamps, pd.Timestamp(bound))
+        else:
+            mask &= keep(timestamps.dt.time, pd.Timestamp(f"2000-01-01 {bound}").time())
+    return mask.fillna(False)
+
+
+class OccurrenceStore:
+    """
+    Lazily loads occurrence files and keeps recently used videos in a memory-bounded LRU.
+
+    Videos are addressed by their file name without extension (e.g. '11_01_23-DJI_0488')
+    or by video_id (e.g. 'DJI_0488') when that is unambiguous.
+    """
+
+    def __init__(self, occurrences_path, video_events_path=None, max_bytes=2 * 1024 ** 3):
+        self.paths = {
+            os.path.splitext(os.path.basename(p))[0]: p
+            for p in sorted(glob(os.path.join(occurrences_path, "*.csv")))
+        }
+        self.video_events_path = video_events_path
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._sizes = {}
+        self._video_events = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def videos(self):
+        return list(self.paths)
+
+    def resolve(self, video):
+        """
+        Map a file name or unambiguous video_id to the file name.
+        """
+        if video in self.paths:
+            return video
+        matches = [name for name in self.paths if name.split("-")[-1] == video]
+        if len(matches) != 1:
+            raise KeyError(f"{video!r} matches {len(matches)} occurrence files")
+        return matches[0]
+
+    def cache_info(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "videos": len(self._cache),
+                "bytes": sum(self._sizes.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+    def load(self, video):
+        """
+        Return the typed DataFrame for a video, loading it on a cache miss.
+
+        Callers must treat the result as read-only since it is shared by the cache.
+        """
+        name = self.resolve(video)
+        with self._lock:
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                self.hits += 1
+                return self._cache[name]
+            self.misses += 1
+
+        df = load_occurrence(self.paths[name])
+        size = int(df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            self._cache[name] = df
+            self._sizes[name] = size
+            self._cache.move_to_end(name)
+            # Evict least recently used videos, always keeping the one just loaded
+            while len(self._cache) > 1 and sum(self._sizes.values()) > self.max_bytes:
+                evicted, _ = self._cache.popitem(last=False)
+                del self._sizes[evicted]
+        return df
+
+    def video_events(self):
+        if self._video_events is None:
+            if self.video_events_path is None:
+                raise ValueError("No video_events.csv configured")
+            self._video_events = pd.read_csv(self.video_events_path)
+        return self._video_events
+
+    def query(self, video, id=None, behaviour=None, start=None, end=None, columns=None):
+        """
+        Filter one video's occurrences by individual, behaviour and/or time window.
+
+        Args:
+            video: File name or video_id
+            id: Mini-scene/individual id (int or list of ints)
+            behaviour: Behaviour label (str or list of str)
+            start, end: Time window bounds (datetime or time of day, inclusive)
+            columns: Optional list of columns to return
+        """
+        df = self.load(video)
+        mask = pd.Series(True, index=df.index)
+        if id is not None:
+            ids = id if isinstance(id, (list, tuple, set)) else [id]
+            mask &= df['id'].isin([int(i) for i in ids]).fillna(False)
+        if behaviour is not None:
+            behaviours = behaviour if isinstance(behaviour, (list, tuple, set)) else [behaviour]
+            mask &= df['behaviour'].isin(behaviours)
+        if (start is not None or end is not None) and 'timestamp' in df.columns:
+            mask &= time_window_mask(df['timestamp'], start, end)
+        result = df[mask.to_numpy(dtype=bool)]
+        return result[columns] if columns else result
+
+    def individuals(self, video, start=None, end=None):
+        """
+        Per-individual aggregates for one video: frames observed, time span and frames per behaviour.
+        """
+        df = self.query(video, start=start, end=end)
+        tracked = df[df['id'].notna()]
+        if tracked.empty:
+            return pd.DataFrame()
+        grouped = tracked.groupby('id', observed=True)
+        summary = grouped.agg(
+            n_frames=('frame', 'nunique'),
+            first_frame=('frame', 'min'),
+            last_frame=('frame', 'max'),
+            **({'start': ('timestamp', 'min'), 'end': ('timestamp', 'max')} if 'timestamp' in df.columns else {}),
+        )
+        if 'behaviour' in tracked.columns:
+            # Unique frames, so duplicated (frame, id) rows do not inflate the counts
+            counts = tracked.groupby(['id', 'behaviour'], observed=True)['frame'].nunique().unstack(fill_value=0)
+            summary = summary.join(counts.add_prefix('behaviour_'))
+        return summary.reset_index()
+
+
+def make_handler(store):
+    """
+    Build a request handler serving JSON query results from store.
+
+    Endpoints:
+        /videos
+        /cache
+        /events
+        /occurrences?video=...&id=...&behaviour=...&start=...&end=...&columns=a,b
+        /individuals?video=...&start=...&end=...
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                if url.path == "/videos":
+                    return self._send(200, store.videos())
+                if url.path == "/cache":
+                    return self._send(200, store.cache_info())
+                if url.path == "/events":
+                    return self._send(200, store.video_events().to_json(orient="records"))
+                if url.path == "/occurrences":
+                    df = store.query(
+                        params["video"],
+                        id=[int(i) for i in params["id"].split(",")] if "id" in params else None,
+                        behaviour=params["behaviour"].split(",") if "behaviour" in params else None,
+                        start=params.get("start"),
+                        end=params.get("end"),
+                        columns=params["columns"].split(",") if "columns" in params else None,
+                    )
+                    return self._send(200, df.to_json(orient="records", date_format="iso"))
+                if url.path == "/individuals":
+                    df = store.individuals(params["video"], params.get("start"), params.get("end"))
+                    return self._send(200, df.to_json(orient="records", date_format="iso"))
+                return self._send(404, {"error": f"Unknown endpoint {url.path}"})
+            except (KeyError, ValueError) as e:
+                return self._send(400, {"error": str(e)})
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query occurrence files, optionally as a local HTTP service")
+    parser.add_argument("--occurrences", type=str, required=True, help="Path to occurrences directory")
+    parser.add_argument("--video_events", type=str, default=None, help="Path to video_events.csv")
+    parser.add_argument("--max_mb", type=int, default=2048, help="Memory budget for cached videos in MB")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host to bind the HTTP service to")
+    parser.add_argument("--port", type=int, default=8000, help="Port for the HTTP service")
+    args = parser.parse_args()
+
+    store = OccurrenceStore(args.occurrences, args.video_events, args.max_mb * 1024 ** 2)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(store))
+    print(f"Serving {len(store.videos())} videos on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import json
+import argparse
+import numpy as np
+from glob import glob
+
+from export_numpy import CATEGORICAL_FIELDS, load_vocabularies, write_vocabularies
+
+" Merges per-shard manifests from merge_behavior_telemetry.py --shard into one summary "
+
+
+def load_manifests(manifest_dir):
+    """
+    Load all shard manifests in manifest_dir, ordered by shard index.
+    """
+    manifests = []
+    for path in glob(os.path.join(manifest_dir, "shard_*_of_*.json")):
+        with open(path) as f:
+            manifest = json.load(f)
+        manifest["path"] = path
+        manifests.append(manifest)
+    return sorted(manifests, key=lambda m: (m["num_shards"], m["shard"]))
+
+
+def reduce_manifests(manifests):
+    """
+    Combine shard manifests into a single summary.
+
+    Raises:
+        ValueError: if manifests from different shard counts are mixed
+    """
+    if not manifests:
+        raise ValueError("No shard manifests found")
+    shard_counts = {m["num_shards"] for m in manifests}
+    if len(shard_counts) > 1:
+        raise ValueError(f"Manifests from different shard counts: {sorted(shard_counts)}")
+    num_shards = shard_counts.pop()
+
+    found = sorted(m["shard"] for m in manifests)
+    seen = {}
+    duplicates = []
+    for m in manifests:
+        for d in m["assigned"]:
+            if d in seen:
+                duplicates.append(d)
+            seen[d] = m["shard"]
+
+    failed_files = sorted(d for m in manifests for d in m["failed_files"])
+    errors = {d: e for m in manifests for d, e in m["errors"].items()}
+    outputs = {d: o for m in manifests for d, o in m["outputs"].items()}
+
+    return {
+        "num_shards": num_shards,
+        "shards_found": found,
+        "missing_shards": sorted(set(range(num_shards)) - set(found)),
+        "assigned": len(seen),
+        "passed": sum(m["passed"] for m in manifests),
+        "failed": sum(m["failed"] for m in manifests),
+        "failed_files": failed_files,
+        "duplicates": sorted(set(duplicates)),
+        "errors": dict(sorted(errors.items())),
+        "outputs": dict(sorted(outputs.items())),
+    }
+
+
+def save_manifest(manifest):
+    """
+    Rewrite a loaded manifest in place, atomically.
+    """
+    path = manifest.pop("path")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    manifest["path"] = path
+
+
+def remap_video(npy_dir, lookups, manifest, output):
+    """
+    Rewrite one video's codes to the global tables without ever remapping twice.
+
+    The remapped array is written to data.npy.tmp, then the output is marked
+    'npy_remapped' in the manifest, then the temporary file replaces data.npy.
+    A run interrupted after the mark only finishes the rename.
+    """
+    path = os.path.join(npy_dir, "data.npy")
+    tmp_path = f"{path}.tmp"
+    if not output.get("npy_remapped"):
+        data = np.load(path)
+        for name, lookup in lookups.items():
+            column = data[name]
+            present = column >= 0
+            column[present] = lookup[column[present]]
+        with open(tmp_path, "wb") as f:
+            np.save(f, data)
+        output["npy_remapped"] = True
+        save_manifest(manifest)
+    if os.path.exists(tmp_path):
+        os.replace(tmp_path, path)
+
+
+def consolidate_npy(manifests):
+    """
+    Give all exported .npy arrays one shared behaviour/label vocabulary.
+
+    Each shard encodes categories with its own code table. The global table
+    starts from any vocabularies.json already in the export directory (videos
+    exported earlier keep their codes), then adds values in order of first
+    appearance by shard index. Every video's codes are rewritten via
+    remap_video(), and manifests are then updated to the global table, so
+    running the reduce step again, also after an interruption, is a no-op.
+
+    Returns:
+        The global vocabularies, or None if no shard exported arrays
+    """
+    npy_manifests = [m for m in manifests if m.get("export_npy")]
+    if not npy_manifests:
+        return None
+
+    vocabularies = {name: [] for name in CATEGORICAL_FIELDS}
+    existing = [load_vocabularies(export_dir) for export_dir in sorted({m["export_npy"] for m in npy_manifests})]
+    for table in existing + [m["npy_vocabularies"] for m in npy_manifests]:
+        for name in CATEGORICAL_FIELDS:
+            for value in table.get(name, []):
+                if value not in vocabularies[name]:
+                    vocabularies[name].append(value)
+
+    for m in npy_manifests:
+        lookups = {}
+        for name in CATEGORICAL_FIELDS:
+            codes = {value: i for i, value in enumerate(vocabularies[name])}
+            local = m["npy_vocabularies"].get(name, [])
+            lookup = np.array([codes[value] for value in local], dtype=np.int16)
+            if not np.array_equal(lookup, np.arange(len(local))):
+                lookups[name] = lookup
+
+        if lookups:
+            for d, output in m["outputs"].items():
+                if "npy" in output:
+                    remap_video(output["npy"], lookups, m, output)
+
+        m["npy_vocabularies"] = vocabularies
+        for output in m["outputs"].values():
+            output.pop("npy_remapped", None)
+        save_manifest(m)
+
+    for export_dir in sorted({m["export_npy"] for m in npy_manifests}):
+        write_vocabularies(export_dir, vocabularies)
+    return vocabularies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge shard manifests into one summary")
+    parser.add_argument("--manifest_dir", type=str, required=True, help="Directory containing shard manifests")
+    parser.add_argument("--output", type=str, default=None, help="Path for the summary JSON (default: <manifest_dir>/summary.json)")
+    args = parser.parse_args()
+
+    manifests = load_manifests(args.manifest_dir)
+    summary = reduce_manifests(manifests)
+    vocabularies = consolidate_npy(manifests)
+    if vocabularies is not None:
+        summary["npy_vocabularies"] = vocabularies
+
+    output_path = args.output or os.path.join(args.manifest_dir, "summary.json")
+    with open(output_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print("Pass: ", summary["passed"], "Fail: ", summary["failed"])
+    print("Failed files:", summary["failed_files"])
+    if summary["missing_shards"]:
+        print("Missing shards:", summary["missing_shards"])
+    if summary["duplicates"]:
+        print("Videos processed by more than one shard:", summary["duplicates"])
+    print(f"Summary written to: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import os
+import argparse
+import pandas as pd
+from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from merge_behavior_telemetry import (
+    process_video,
+    DEFAULT_SESSION_DATA_PATH,
+    DEFAULT_FLIGHT_LOGS_PATH,
+)
+from add_gps_data import add_gps_columns, add_gps_to_sessions, VIDEO_GPS_COLUMNS, SESSION_GPS_COLUMNS
+from add_event_times import add_event_time_columns, EVENT_TIME_COLUMNS
+from update_video_events import build_inventory, add_associated_media
+from export_numpy import export_video, load_vocabularies, write_vocabularies
+from validate_occurrences import validate_occurrences, write_report, print_summary
+
+" Runs merge, GPS, event times and media linkage as one in-process dependency graph "
+
+
+def run_dag(stages, max_workers=4):
+    """
+    Run a dependency graph of stages, starting each stage as soon as its dependencies finish.
+
+    Args:
+        stages: dict mapping stage name -> (list of dependency names, callable)
+            The callable receives a dict of {dependency name: result}.
+        max_workers: Maximum number of stages running at once
+
+    Returns:
+        dict mapping stage name -> result
+    """
+    for name, (deps, _) in stages.items():
+        for dep in deps:
+            if dep not in stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+
+    results = {}
+    pending = dict(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            ready = [name for name, (deps, _) in pending.items() if all(dep in results for dep in deps)]
+            for name in ready:
+                deps, func = pending.pop(name)
+                running[pool.submit(func, {dep: results[dep] for dep in deps})] = name
+
+            if not running:
+                raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                # Re-raises the stage's exception, if any
+                results[name] = future.result()
+    return results
+
+
+def write_csvs_atomic(outputs):
+    """
+    Write several DataFrames so that either all target files are replaced or none are.
+
+    Every DataFrame is first written to a temporary file next to its target; the
+    temporaries are only renamed over the targets once all writes succeeded.
+
+    Args:
+        outputs: list of (DataFrame, path) tuples
+    """
+    tmp_paths = []
+    try:
+        for df, path in outputs:
+            tmp_path = f"{path}.tmp"
+            df.to_csv(tmp_path, index=False)
+            tmp_paths.append((tmp_path, path))
+    except Exception:
+        for tmp_path, _ in tmp_paths:
+            os.remove(tmp_path)
+        raise
+
+    for tmp_path, path in tmp_paths:
+        os.replace(tmp_path, path)
+        print(f"Written: {path}")
+
+
+def build_stages(args, video_df, session_df):
+    """
+    Describe the enrichment pipeline as a dependency graph for run_dag().
+
+    video_df and session_df are read once by the caller; every stage that
+    modifies them works on its own copy and returns only the columns it owns.
+    """
+    flight_logs_path = None if args.skip_airdata else args.flight_logs_path
+
+    def merge(_):
+        data_dirs = sorted(x for x in os.listdir(args.data_path) if not x.startswith("."))
+        occurrences = {}
+        telemetry = {}
+        tracks = {}
+        failed_files = []
+        for d in tqdm(data_dirs):
+            try:
+                occurrences[d], telemetry[d], tracks[d] = process_video(
+                    d, args.data_path, args.session_data_path, flight_logs_path, args.flight_log_alignment,
+                    return_frames=True,
+                )
+            except Exception as e:
+                failed_files.append(d)
+                print(f"Failed on {d}: {str(e)}")
+        print("Pass: ", len(occurrences), "Fail: ", len(failed_files))
+        print("Failed files:", failed_files)
+        # Per-frame telemetry and tracks are only kept for validation
+        return {"occurrences": occurrences, "telemetry": telemetry, "tracks": tracks}
+
+    def get_occurrence_from(occurrences):
+        def get_occurrence(date_part, video_id):
+            for key in (f"{date_part}-{video_id}", f"{date_part}_{video_id}"):
+                if key in occurrences:
+                    return occurrences[key]
+            return None
+        return get_occurrence
+
+    def write_occurrences(results):
+        if args.outpath is None:
+            return None
+        os.makedirs(args.outpath, exist_ok=True)
+        write_csvs_atomic([
+            (occ_df, os.path.join(args.outpath, f"{d}.csv"))
+            for d, occ_df in results["merge"]["occurrences"].items()
+        ])
+
+    def export_npy(results):
+        if args.export_npy is None:
+            return None
+        vocabularies = load_vocabularies(args.export_npy)
+        for d, occ_df in results["merge"]["occurrences"].items():
+            export_video(occ_df, os.path.join(args.export_npy, d), vocabularies)
+        write_vocabularies(args.export_npy, vocabularies)
+
+    def validate(results):
+        merged = results["merge"]
+        report = validate_occurrences(
+            merged["occurrences"], telemetry=merged["telemetry"], tracks=merged["tracks"]
+        )
+        print_summary(report)
+        report_path = args.validation_report or os.path.join(
+            os.path.dirname(os.path.abspath(args.output_video or args.video_events)), "validation_report.json"
+        )
+        write_report(report, report_path)
+        return report
+
+    def gps(results):
+        df = add_gps_columns(video_df.copy(), get_occurrence_from(results["merge"]["occurrences"]))
+        return df[VIDEO_GPS_COLUMNS]
+
+    def event_times(results):
+        df = add_event_time_columns(video_df.copy(), get_occurrence_from(results["merge"]["occurrences"]))
+        return df[[col for col in EVENT_TIME_COLUMNS if col in df.columns]]
+
+    def inventory(_):
+        return build_inventory(args.data_path, args.inventory_cache, args.workers)
+
+    def media(results):
+        df = add_associated_media(video_df.copy(), results["inventory"])
+        return df[["associatedMedia"]]
+
+    def sessions(results):
+        videos_with_gps = video_df.copy()
+        videos_with_gps[VIDEO_GPS_COLUMNS] = results["gps"]
+        df = add_gps_to_sessions(session_df.copy(), videos_with_gps)
+        return df[SESSION_GPS_COLUMNS]
+
+    return {
+        "merge": ([], merge),
+        "inventory": ([], inventory),
+        "write_occurrences": (["merge"], write_occurrences),
+        "export_npy": (["merge"], export_npy),
+        "validate": (["merge"], validate),
+        "gps": (["merge"], gps),
+        "event_times": (["merge"], event_times),
+        "media": (["inventory"], media),
+        "sessions": (["gps"], sessions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the KABR merge and event enrichment steps as a single pipeline"
+    )
+    parser.add_argument("--data_path", type=str, required=True, help="Path to data directory containing video directories")
+    parser.add_argument("--session_data_path", type=str, default=DEFAULT_SESSION_DATA_PATH, help="Path to session_data directory containing SRT files")
+    parser.add_argument("--flight_logs_path", type=str, default=DEFAULT_FLIGHT_LOGS_PATH, help="Path to decrypted_flight_logs directory")
+    parser.add_argument("--skip-airdata", action="store_true", help="Skip merging with airdata/flight log files")
+    parser.add_argument("--flight_log_alignment", choices=["nearest", "interpolate"], default="nearest", help="How to attach flight log rows to frames")
+    parser.add_argument("--outpath", type=str, default=None, help="Directory to write occurrence CSVs to (default: do not write)")
+    parser.add_argument("--export_npy", type=str, default=None, help="Directory for memory-mappable .npy arrays per video (default: do not write)")
+    parser.add_argument("--video_events", type=str, required=True, help="Path to video_events.csv")
+    parser.add_argument("--session_events", type=str, required=True, help="Path to session_events.csv")
+    parser.add_argument("--output_video", type=str, default=None, help="Output path for video_events (default: overwrite)")
+    parser.add_argument("--output_session", type=str, default=None, help="Output path for session_events (default: overwrite)")
+    parser.add_argument("--inventory_cache", type=str, default=None, help="JSON file caching checksums between runs (default: no cache)")
+    parser.add_argument("--validation_report", type=str, default=None, help="Path for the JSON validation report (default: next to video_events)")
+    parser.add_argument("--workers", type=int, default=8, help="Number of threads used to hash files")
+    args = parser.parse_args()
+
+    video_df = pd.read_csv(args.video_events)
+    session_df = pd.read_csv(args.session_events)
+
+    results = run_dag(build_stages(args, video_df, session_df))
+
+    # Combine the columns produced by each stage
+    for stage in ["gps", "event_times", "media"]:
+        for col in results[stage].columns:
+            video_df[col] = results[stage][col]
+    for col in results["sessions"].columns:
+        session_df[col] = results["sessions"][col]
+
+    write_csvs_atomic([
+        (video_df, args.output_video or args.video_events),
+        (session_df, args.output_session or args.session_events),
+    ])
+
+    print("\n" + "=" * 80)
+    print("DONE!")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
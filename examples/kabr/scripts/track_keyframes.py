@@ -0,0 +1,195 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+from merge_behavior_telemetry import pandify_xml_tracks
+
+" Keyframe-compressed storage for CVAT tracks with on-demand interpolation "
+
+BOX_COLUMNS = ['xtl', 'ytl', 'xbr', 'ybr']
+STATE_COLUMNS = ['outside', 'occluded']
+
+
+def prepare_tracks(track_df):
+    """
+    Convert a pandify_xml_tracks() DataFrame to numeric boxes/flags sorted by track and frame.
+    """
+    df = track_df.copy()
+    df[BOX_COLUMNS] = df[BOX_COLUMNS].astype(np.float64)
+    for col in STATE_COLUMNS + ['keyframe']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(np.int8)
+    df['frame'] = df['frame'].astype(np.int64)
+    return df.sort_values(['id', 'frame'], kind='stable').reset_index(drop=True)
+
+
+def _track_bounds(ids):
+    """
+    Boolean masks for the first and last row of each track (rows sorted by id).
+    """
+    new_track = np.r_[True, ids[1:] != ids[:-1]]
+    last_in_track = np.r_[new_track[1:], True]
+    return new_track, last_in_track
+
+
+def _interpolation_error(frames, boxes, keep):
+    """
+    Max absolute coordinate error when every row is reconstructed from the kept rows around it.
+    """
+    kept_idx = np.flatnonzero(keep)
+    n_kept_so_far = np.cumsum(keep)
+    left = kept_idx[n_kept_so_far - 1]
+    right = kept_idx[np.minimum(n_kept_so_far, len(kept_idx) - 1)]
+
+    span = frames[right] - frames[left]
+    t = np.where(keep | (span == 0), 0.0, (frames - frames[left]) / np.where(span == 0, 1, span))
+    predicted = boxes[left] + t[:, None] * (boxes[right] - boxes[left])
+    return np.abs(predicted - boxes).max(axis=1), left
+
+
+def compress_tracks(track_df, tolerance=0.01, max_iterations=20):
+    """
+    Keep only the rows needed to reconstruct every track within tolerance.
+
+    Kept rows are CVAT keyframes, the first and last box of each track, the
+    boundaries of runs of consecutive frames, and every outside/occluded
+    transition. If an interpolated box (e.g. after manual editing) deviates from
+    linear interpolation by more than tolerance pixels, the worst offending box
+    per segment is kept as well, until all boxes are within tolerance.
+
+    Args:
+        track_df: DataFrame returned by pandify_xml_tracks()
+        tolerance: Maximum reconstruction error in pixels
+        max_iterations: Refinement passes before all remaining outliers are kept
+
+    Returns:
+        Keyframe DataFrame with the original columns plus 'gap_after'
+        (1 if the track has no box on the following frame)
+    """
+    df = prepare_tracks(track_df)
+    if df.empty:
+        return df.assign(gap_after=pd.Series(dtype=np.int8))
+
+    ids = df['id'].to_numpy()
+    frames = df['frame'].to_numpy()
+    boxes = df[BOX_COLUMNS].to_numpy()
+
+    new_track, last_in_track = _track_bounds(ids)
+    contiguous_prev = np.r_[False, frames[1:] == frames[:-1] + 1] & ~new_track
+    gap_after = ~last_in_track & ~np.r_[contiguous_prev[1:], False]
+
+    keep = new_track | last_in_track | ~contiguous_prev | gap_after
+    if 'keyframe' in df.columns:
+        keep |= df['keyframe'].to_numpy() == 1
+    for col in STATE_COLUMNS:
+        if col in df.columns:
+            values = df[col].to_numpy()
+            keep |= np.r_[True, values[1:] != values[:-1]]
+
+    for iteration in range(max_iterations + 1):
+        error, left = _interpolation_error(frames, boxes, keep)
+        outliers = error > tolerance
+        if not outliers.any():
+            break
+        if iteration == max_iterations:
+            keep |= outliers
+            break
+        # Keep the worst box of each segment and re-check
+        worst = pd.Series(error[outliers]).groupby(left[outliers]).idxmax()
+        keep[np.flatnonzero(outliers)[worst.to_numpy()]] = True
+
+    keyframes = df[keep].copy()
+    keyframes['gap_after'] = gap_after[keep].astype(np.int8)
+    return keyframes.reset_index(drop=True)
+
+
+def interpolate_tracks(keyframes, start_frame=None, end_frame=None, track_ids=None):
+    """
+    Reconstruct per-frame boxes from compress_tracks() output.
+
+    Boxes are linearly interpolated between consecutive keyframes of a track,
+    outside/occluded flags and other attributes are carried forward from the
+    preceding keyframe. Only segments overlapping the requested frame range
+    are expanded.
+
+    Args:
+        keyframes: DataFrame returned by compress_tracks() (or read back from CSV)
+        start_frame: First frame to return (inclusive, default: first frame)
+        end_frame: Last frame to return (inclusive, default: last frame)
+        track_ids: Optional iterable of track ids to return (matched as strings, since
+            ids are str from the XML but int when read back from CSV)
+
+    Returns:
+        DataFrame with one row per (track, frame) in the same layout as pandify_xml_tracks()
+    """
+    kf = keyframes
+    if track_ids is not None:
+        kf = kf[kf['id'].astype(str).isin([str(t) for t in track_ids])]
+    kf = kf.sort_values(['id', 'frame'], kind='stable').reset_index(drop=True)
+    if kf.empty:
+        return kf.drop(columns='gap_after')
+
+    ids = kf['id'].to_numpy()
+    frames = kf['frame'].to_numpy(np.int64)
+    boxes = kf[BOX_COLUMNS].to_numpy(np.float64)
+    gap_after = kf['gap_after'].to_numpy() == 1
+
+    _, last_in_track = _track_bounds(ids)
+    next_frame = np.r_[frames[1:], frames[-1]]
+    interpolating = ~(last_in_track | gap_after)
+    span = np.where(interpolating, next_frame - frames, 1)
+
+    # Only expand segments that overlap the requested range
+    selected = np.ones(len(kf), dtype=bool)
+    if start_frame is not None:
+        selected &= frames + span - 1 >= start_frame
+    if end_frame is not None:
+        selected &= frames <= end_frame
+    segments = np.flatnonzero(selected)
+    n = span[segments]
+
+    rows = np.repeat(segments, n)
+    offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    following = np.minimum(rows + 1, len(kf) - 1)
+    t = offset / span[rows]
+    interpolated = boxes[rows] + t[:, None] * (boxes[following] - boxes[rows])
+
+    result = kf.iloc[rows].drop(columns='gap_after').reset_index(drop=True)
+    result['frame'] = frames[rows] + offset
+    result[BOX_COLUMNS] = interpolated
+    if 'keyframe' in result.columns:
+        result['keyframe'] = np.where(offset == 0, result['keyframe'], 0).astype(np.int8)
+
+    in_range = np.ones(len(result), dtype=bool)
+    if start_frame is not None:
+        in_range &= result['frame'].to_numpy() >= start_frame
+    if end_frame is not None:
+        in_range &= result['frame'].to_numpy() <= end_frame
+    return result[in_range].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compress CVAT tracks to keyframes")
+    parser.add_argument("--tracks", type=str, required=True, help="Path to {video_id}_tracks.xml")
+    parser.add_argument("--output", type=str, required=True, help="Path to write the keyframe CSV")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Maximum reconstruction error in pixels")
+    args = parser.parse_args()
+
+    track_df = pandify_xml_tracks(args.tracks)
+    keyframes = compress_tracks(track_df, args.tolerance)
+    keyframes.to_csv(args.output, index=False)
+
+    # Verify the round trip
+    original = prepare_tracks(track_df)
+    restored = interpolate_tracks(keyframes)
+    max_error = float(np.abs(restored[BOX_COLUMNS].to_numpy() - original[BOX_COLUMNS].to_numpy()).max()) \
+        if len(restored) == len(original) and len(original) else None
+
+    print(f"Boxes: {len(track_df)} -> keyframes: {len(keyframes)} "
+          f"({len(track_df) / max(len(keyframes), 1):.1f}x smaller)")
+    print(f"Reconstructed boxes: {len(restored)}, max error: {max_error}")
+    print(f"Keyframes written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,155 @@
 import pandas as pd
 import json
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def update_video_events(
-    video_events_path,
-    data_path,
-    output_path=None
-):
+# Relative path from the kabr-behavior-telemetry/data directory to the annotation data
+MEDIA_PREFIX = "../../../mini-scenes_zebras/kabr-datapalooza-2023/data"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path):
+    """
+    Compute the sha256 hex digest of a file, reading it in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scan_files(data_path, extensions=(".xml",)):
+    """
+    Walk data_path once and stat every file with a matching extension.
+
+    Returns:
+        dict mapping path relative to data_path (POSIX separators) -> (size, mtime_ns)
+    """
+    found = {}
+    stack = [data_path]
+    # Symlinked directories are followed, but each real directory is scanned once
+    visited = set()
+    while stack:
+        current = stack.pop()
+        real = os.path.realpath(current)
+        if real in visited:
+            continue
+        visited.add(real)
+        try:
+            entries = list(os.scandir(current))
+        except OSError as e:
+            print(f"Warning: Could not scan {current}: {str(e)}")
+            continue
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=True):
+                stack.append(entry.path)
+            elif entry.name.endswith(extensions):
+                st = entry.stat()
+                rel = Path(os.path.relpath(entry.path, data_path)).as_posix()
+                found[rel] = (st.st_size, st.st_mtime_ns)
+    return found
+
+
+def load_inventory_cache(cache_path):
+    """
+    Load a previously written inventory cache, keyed by relative path.
     """
-    Update video_events.csv with associatedMedia paths for detections and behavior annotations.
+    if cache_path is None or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Ignoring unreadable inventory cache {cache_path}: {str(e)}")
+        return {}
+
+
+def save_inventory_cache(cache_path, inventory):
+    """
+    Write the inventory cache atomically so an interrupted run never leaves a truncated file.
+    """
+    if cache_path is None:
+        return
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(inventory, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def build_inventory(data_path, cache_path=None, max_workers=8):
+    """
+    Build a file inventory of data_path with sizes and sha256 checksums.
+
+    Files are hashed in a thread pool; entries from cache_path are reused when
+    their (path, size, mtime) still match, so only new or modified files are read.
 
     Args:
-        video_events_path: Path to video_events.csv
         data_path: Path to the data directory containing video directories
-        output_path: Path to write updated CSV (if None, overwrites input)
+        cache_path: Optional JSON file used to persist checksums between runs
+        max_workers: Number of hashing threads
+
+    Returns:
+        dict mapping relative path -> {"bytes": int, "mtime_ns": int, "sha256": str}
     """
-    # Read video_events.csv
-    df = pd.read_csv(video_events_path)
+    found = scan_files(data_path)
+    cache = load_inventory_cache(cache_path)
+
+    inventory = {}
+    to_hash = []
+    for rel, (size, mtime_ns) in found.items():
+        cached = cache.get(rel)
+        if cached and cached.get("bytes") == size and cached.get("mtime_ns") == mtime_ns:
+            inventory[rel] = cached
+        else:
+            to_hash.append(rel)
+
+    print(f"Inventory: {len(found)} files, {len(found) - len(to_hash)} cached, {len(to_hash)} to hash")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        digests = pool.map(lambda rel: sha256_file(os.path.join(data_path, rel)), to_hash)
+        for rel, digest in zip(to_hash, digests):
+            size, mtime_ns = found[rel]
+            inventory[rel] = {"bytes": size, "mtime_ns": mtime_ns, "sha256": digest}
+
+    save_inventory_cache(cache_path, inventory)
+    return inventory
+
+
+def media_entry(rel, info):
+    """
+    Format an inventory record for the associatedMedia JSON.
+    """
+    return {
+        "path": f"{MEDIA_PREFIX}/{rel}",
+        "bytes": info["bytes"],
+        "sha256": info["sha256"]
+    }
+
+
+def add_associated_media(df, inventory):
+    """
+    Update a video_events DataFrame with associatedMedia entries from a file inventory.
+
+    Args:
+        df: video_events DataFrame (modified in place)
+        inventory: Inventory returned by build_inventory(); rows only do dictionary lookups
+    """
+    # JSON strings need an object column (a blank column is read as float64)
+    if 'associatedMedia' in df.columns:
+        df['associatedMedia'] = df['associatedMedia'].astype(object)
+
+    # Group behavior annotations by their actions directory
+    actions_index = {}
+    for rel in sorted(inventory):
+        parent, _, name = rel.rpartition("/")
+        if parent.endswith("/actions"):
+            actions_index.setdefault(parent, []).append(rel)
 
     # Parse the eventID to extract date and video_id
     # Format: KABR-2023:DATE_SESSION:VIDEO_ID
@@ -43,33 +175,15 @@ def update_video_events(
         # Construct the directory name
         dir_name = f"{date_part}-{video_id}"
 
-        # Build paths to detections and behavior files
-        detections_path = os.path.join(data_path, dir_name, "metadata", f"{video_id}_tracks.xml")
-
-        # For behavior annotations, we need to find all XML files in the actions directory
-        actions_dir = os.path.join(data_path, dir_name, "actions")
-        behavior_files = []
-
-        if os.path.exists(actions_dir):
-            behavior_files = [f for f in os.listdir(actions_dir) if f.endswith('.xml')]
-            behavior_files.sort()  # Sort for consistency
-
-        # Check if files exist
-        detections_exists = os.path.exists(detections_path)
-
-        # Create relative paths from the kabr-behavior-telemetry/data directory
-        detections_rel = f"../../../mini-scenes_zebras/kabr-datapalooza-2023/data/{dir_name}/metadata/{video_id}_tracks.xml" if detections_exists else ""
-
-        # Create behavior annotations list with relative paths
-        behavior_rel_list = []
-        if behavior_files:
-            for bf in behavior_files:
-                behavior_rel_list.append(f"../../../mini-scenes_zebras/kabr-datapalooza-2023/data/{dir_name}/actions/{bf}")
+        # Look up detections and behavior annotations in the inventory
+        detections_rel = f"{dir_name}/metadata/{video_id}_tracks.xml"
+        detections_exists = detections_rel in inventory
+        behavior_files = actions_index.get(f"{dir_name}/actions", [])
 
         # Update the associatedMedia field with JSON structure
         associated_media = {
-            "detection": detections_rel,
-            "behavior": behavior_rel_list
+            "detection": media_entry(detections_rel, inventory[detections_rel]) if detections_exists else None,
+            "behavior": [media_entry(bf, inventory[bf]) for bf in behavior_files]
         }
 
         # Update the dataframe
@@ -77,9 +191,37 @@ def update_video_events(
 
         # Print status
         status = "✓" if detections_exists else "✗"
-        behavior_count = len(behavior_files) if behavior_files else 0
+        behavior_count = len(behavior_files)
         print(f"{status} {video_id}: detections={detections_exists}, behaviors={behavior_count}")
 
+    return df
+
+
+def update_video_events(
+    video_events_path,
+    data_path,
+    output_path=None,
+    cache_path=None,
+    max_workers=8
+):
+    """
+    Update video_events.csv with associatedMedia paths, sizes and checksums for
+    detections and behavior annotations.
+
+    Args:
+        video_events_path: Path to video_events.csv
+        data_path: Path to the data directory containing video directories
+        output_path: Path to write updated CSV (if None, overwrites input)
+        cache_path: Optional JSON file caching checksums by (path, size, mtime)
+        max_workers: Number of threads used to hash files
+    """
+    # Read video_events.csv
+    df = pd.read_csv(video_events_path)
+
+    # Single inventory pass over data_path
+    inventory = build_inventory(data_path, cache_path, max_workers)
+    add_associated_media(df, inventory)
+
     # Write the updated CSV
     if output_path is None:
         output_path = video_events_path
@@ -109,11 +251,25 @@ if __name__ == "__main__":
         default=None,
         help="Output path (default: overwrites input)"
     )
+    parser.add_argument(
+        "--inventory_cache",
+        type=str,
+        default=None,
+        help="JSON file caching checksums between runs (default: no cache)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Number of threads used to hash files"
+    )
 
     args = parser.parse_args()
 
     update_video_events(
         args.video_events,
         args.data_path,
-        args.output
+        args.output,
+        args.inventory_cache,
+        args.workers
     )
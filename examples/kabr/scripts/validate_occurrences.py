@@ -0,0 +1,285 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from glob import glob
+from tqdm import tqdm
+
+from merge_behavior_telemetry import parse_srt_datetimes, pandify_xml_tracks
+
+" Vectorized data quality checks over frame-level occurrence files "
+
+# Sensor resolution from the dataset card (5.4K)
+DEFAULT_IMAGE_SIZE = (5472, 3078)
+
+BOX_COLUMNS = ['xtl', 'ytl', 'xbr', 'ybr']
+
+# Only these columns are needed, so CSVs can be read with usecols
+VALIDATION_COLUMNS = ['frame', 'date_time', 'id', 'latitude', 'longitude',
+                      'outside_x', 'behaviour', 'datetime(utc)'] + BOX_COLUMNS
+
+
+def check_frames(occ_df):
+    """
+    Frame continuity: gaps in the SRT frame sequence.
+    """
+    frames = np.unique(pd.to_numeric(occ_df['frame'], errors='coerce').dropna().to_numpy(np.int64))
+    steps = np.diff(frames)
+    gaps = steps > 1
+    return {
+        'n_frames': int(frames.size),
+        'first_frame': int(frames[0]) if frames.size else None,
+        'last_frame': int(frames[-1]) if frames.size else None,
+        'n_gaps': int(gaps.sum()),
+        'missing_frames': int((steps[gaps] - 1).sum()),
+    }
+
+
+def check_timestamps(per_frame):
+    """
+    Timestamp monotonicity of date_time across frames.
+    """
+    if 'date_time' not in per_frame.columns:
+        return {'unparsed': int(len(per_frame)), 'non_monotonic': 0, 'max_step_s': None}
+    ts = parse_srt_datetimes(per_frame['date_time'])
+    steps = np.diff(ts.dropna().to_numpy().astype(np.int64)) / 1e9
+    return {
+        'unparsed': int(ts.isna().sum()),
+        'non_monotonic': int((steps < 0).sum()),
+        'max_step_s': float(steps.max()) if steps.size else None,
+    }
+
+
+def check_boxes(occ_df, image_size):
+    """
+    Bounding box sanity: degenerate boxes and boxes outside the image bounds.
+
+    Boxes that CVAT marks as outside the frame are not checked.
+    """
+    if not set(BOX_COLUMNS).issubset(occ_df.columns):
+        return {'n_boxes': 0, 'degenerate': 0, 'out_of_bounds': 0}
+    boxes = occ_df[BOX_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(np.float64)
+    valid = ~np.isnan(boxes).any(axis=1)
+    if 'outside_x' in occ_df.columns:
+        valid &= pd.to_numeric(occ_df['outside_x'], errors='coerce').fillna(0).to_numpy() != 1
+    boxes = boxes[valid]
+    xtl, ytl, xbr, ybr = boxes.T
+    width, height = image_size
+    return {
+        'n_boxes': int(len(boxes)),
+        'degenerate': int(((xbr <= xtl) | (ybr <= ytl)).sum()),
+        'out_of_bounds': int(((xtl < 0) | (ytl < 0) | (xbr > width) | (ybr > height)).sum()),
+    }
+
+
+def _track_ids(ids):
+    """
+    Normalise mini-scene ids (str in memory, int when read back from CSV) to nullable ints.
+    """
+    return pd.to_numeric(ids, errors='coerce').astype('Int64')
+
+
+def check_behaviours(occ_df, track_df=None):
+    """
+    Mini-scene alignment: duplicated rows, holes, behaviours on outside boxes and track mismatches.
+
+    The mini-scene merge in process_video() can repeat (frame, id) rows. An offset
+    in the first_frame logic of add_per_frame_behaviours() shifts or truncates the
+    annotated frames of a track; with track_df (pandify_xml_tracks() output) the
+    annotated frame count and span of every track are compared to its boxes.
+    """
+    result = {'n_tracks': 0, 'duplicate_rows': 0, 'tracks_with_gaps': 0, 'behaviour_on_outside': 0,
+              'track_count_mismatch': None, 'track_span_mismatch': None}
+    if 'id' not in occ_df.columns or 'behaviour' not in occ_df.columns:
+        return result
+    tracked = occ_df[occ_df['id'].notna()]
+    ids = _track_ids(tracked['id'])
+    frames = pd.to_numeric(tracked['frame'], errors='coerce')
+    spans = frames.groupby(ids).agg(['min', 'max', 'nunique'])
+
+    result['n_tracks'] = int(len(spans))
+    result['duplicate_rows'] = int(pd.DataFrame({'frame': frames, 'id': ids}).duplicated().sum())
+    result['tracks_with_gaps'] = int((spans['max'] - spans['min'] + 1 > spans['nunique']).sum())
+    if 'outside_x' in tracked.columns:
+        outside = pd.to_numeric(tracked['outside_x'], errors='coerce') == 1
+        result['behaviour_on_outside'] = int((outside & tracked['behaviour'].notna()).sum())
+
+    if track_df is not None and len(spans):
+        boxes = pd.to_numeric(track_df['frame'], errors='coerce').groupby(_track_ids(track_df['id'])).agg(
+            ['min', 'max', 'count'])
+        # Only annotated tracks are compared; tracks missing from the XML count as mismatches
+        boxes = boxes.reindex(spans.index)
+        result['track_count_mismatch'] = int((spans['nunique'] != boxes['count']).sum())
+        result['track_span_mismatch'] = int(((spans['min'] != boxes['min']) | (spans['max'] != boxes['max'])).sum())
+    return result
+
+
+def check_telemetry(per_frame, annotated_only=False):
+    """
+    Telemetry coverage: share of frames with SRT GPS and with a matched flight log row.
+
+    per_frame should hold one row per SRT frame (process_video(..., return_frames=True)).
+    Occurrence files only carry telemetry on annotated rows, so when only those are
+    available coverage is measured over annotated frames (annotated_only=True).
+    """
+    n = len(per_frame)
+    result = {'frames_checked': int(n), 'annotated_only': annotated_only,
+              'srt_gps_coverage': None, 'flight_log_coverage': None}
+    if n == 0:
+        return result
+    result['srt_gps_coverage'] = 0.0
+    if 'latitude' in per_frame.columns:
+        result['srt_gps_coverage'] = float(pd.to_numeric(per_frame['latitude'], errors='coerce').notna().mean())
+    # datetime(utc) is carried over from the flight log by merge_flight_log_data()
+    if 'datetime(utc)' in per_frame.columns:
+        result['flight_log_coverage'] = float(per_frame['datetime(utc)'].notna().mean())
+    return result
+
+
+def validate_occurrence(occ_df, image_size=DEFAULT_IMAGE_SIZE, min_flight_log_coverage=0.95,
+                        telemetry_df=None, track_df=None):
+    """
+    Run all checks on one occurrence DataFrame.
+
+    Args:
+        occ_df: Occurrence DataFrame
+        telemetry_df: Optional per-frame SRT/flight log DataFrame for telemetry coverage
+        track_df: Optional detection tracks for the mini-scene alignment check
+
+    Returns:
+        dict with one entry per check group plus an 'issues' list naming failed checks
+    """
+    per_frame = occ_df.drop_duplicates('frame')
+    if telemetry_df is not None:
+        telemetry = check_telemetry(telemetry_df.drop_duplicates('frame'))
+    elif 'id' in occ_df.columns:
+        telemetry = check_telemetry(occ_df[occ_df['id'].notna()].drop_duplicates('frame'), annotated_only=True)
+    else:
+        telemetry = check_telemetry(occ_df.iloc[0:0], annotated_only=True)
+
+    result = {
+        'frames': check_frames(occ_df),
+        'timestamps': check_timestamps(per_frame),
+        'boxes': check_boxes(occ_df, image_size),
+        'behaviours': check_behaviours(occ_df, track_df),
+        'telemetry': telemetry,
+    }
+
+    issues = []
+    if result['frames']['missing_frames']:
+        issues.append('missing_frames')
+    if result['timestamps']['unparsed']:
+        issues.append('unparsed_timestamps')
+    if result['timestamps']['non_monotonic']:
+        issues.append('non_monotonic_timestamps')
+    if result['boxes']['degenerate']:
+        issues.append('degenerate_boxes')
+    if result['boxes']['out_of_bounds']:
+        issues.append('boxes_out_of_bounds')
+    behaviours = result['behaviours']
+    if behaviours['duplicate_rows']:
+        issues.append('duplicate_frame_ids')
+    if behaviours['behaviour_on_outside'] or behaviours['track_count_mismatch'] or behaviours['track_span_mismatch']:
+        issues.append('behaviour_misaligned')
+    if result['telemetry']['srt_gps_coverage'] is not None and result['telemetry']['srt_gps_coverage'] < 1:
+        issues.append('missing_srt_gps')
+    flight_log_coverage = result['telemetry']['flight_log_coverage']
+    if flight_log_coverage is not None and flight_log_coverage < min_flight_log_coverage:
+        issues.append('low_flight_log_coverage')
+    result['issues'] = issues
+    return result
+
+
+def validate_occurrences(occurrences, image_size=DEFAULT_IMAGE_SIZE, min_flight_log_coverage=0.95,
+                         telemetry=None, tracks=None):
+    """
+    Validate a set of occurrence DataFrames.
+
+    Args:
+        occurrences: dict mapping video name (e.g. '11_01_23-DJI_0488') -> occurrence DataFrame
+        telemetry: Optional dict mapping video name -> per-frame telemetry DataFrame
+        tracks: Optional dict mapping video name -> detection track DataFrame
+
+    Returns:
+        Report dict with a summary and per-video results
+    """
+    telemetry = telemetry or {}
+    tracks = tracks or {}
+    videos = {}
+    for name in sorted(occurrences):
+        videos[name] = validate_occurrence(
+            occurrences[name], image_size, min_flight_log_coverage,
+            telemetry.get(name), tracks.get(name),
+        )
+
+    issue_counts = {}
+    for result in videos.values():
+        for issue in result['issues']:
+            issue_counts[issue] = issue_counts.get(issue, 0) + 1
+
+    return {
+        'summary': {
+            'n_videos': len(videos),
+            'n_videos_with_issues': sum(1 for r in videos.values() if r['issues']),
+            'issue_counts': issue_counts,
+            'image_size': list(image_size),
+            'min_flight_log_coverage': min_flight_log_coverage,
+        },
+        'videos': videos,
+    }
+
+
+def write_report(report, output_path):
+    """
+    Write the validation report as JSON, replacing any previous report atomically.
+    """
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, output_path)
+    print(f"Validation report written to: {output_path}")
+
+
+def print_summary(report):
+    summary = report['summary']
+    print(f"Validated {summary['n_videos']} videos, {summary['n_videos_with_issues']} with issues")
+    for issue, count in sorted(summary['issue_counts'].items()):
+        print(f"  {issue}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate frame-level occurrence files")
+    parser.add_argument("--occurrences", type=str, required=True, help="Path to occurrences directory")
+    parser.add_argument("--output", type=str, default="validation_report.json", help="Path to write the JSON report")
+    parser.add_argument("--image_width", type=int, default=DEFAULT_IMAGE_SIZE[0], help="Video frame width in pixels")
+    parser.add_argument("--image_height", type=int, default=DEFAULT_IMAGE_SIZE[1], help="Video frame height in pixels")
+    parser.add_argument("--min_flight_log_coverage", type=float, default=0.95,
+                        help="Minimum share of frames matched to a flight log row")
+    parser.add_argument("--data_path", type=str, default=None,
+                        help="Video directories with metadata/{video_id}_tracks.xml, to compare annotations with tracks")
+    args = parser.parse_args()
+
+    occurrences = {}
+    tracks = {}
+    for path in tqdm(sorted(glob(os.path.join(args.occurrences, "*.csv")))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        occurrences[name] = pd.read_csv(path, usecols=lambda c: c in VALIDATION_COLUMNS, low_memory=False)
+        if args.data_path:
+            path2tracks = os.path.join(args.data_path, name, "metadata", f"{name.split('-')[-1]}_tracks.xml")
+            if os.path.exists(path2tracks):
+                tracks[name] = pandify_xml_tracks(path2tracks)
+
+    # Without the SRT frames, telemetry coverage is measured over annotated frames only
+    report = validate_occurrences(
+        occurrences,
+        (args.image_width, args.image_height),
+        args.min_flight_log_coverage,
+        tracks=tracks,
+    )
+    print_summary(report)
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()